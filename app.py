@@ -6,12 +6,16 @@
 - 回调接口: https://developer.work.weixin.qq.com/document/path/90930
 - 青云对象存储: https://docsv4.qingcloud.com/user_guide/storage/object_storage/sdk/python/
 """
+import functools
+import io
 import os
 import re
 import sys
 import threading
 import time
 import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
 from flask import Flask, request, jsonify
@@ -20,7 +24,15 @@ from dotenv import load_dotenv
 # 导入企业微信官方 SDK
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'weworkapi_python-master', 'callback_python3'))
 from WXBizMsgCrypt import WXBizMsgCrypt
-import xml.etree.ElementTree as ET
+# 优先使用 lxml（C 实现的解析器），未安装时回退到标准库
+try:
+    from lxml import etree as ET
+    # 禁止解析外部实体和访问网络，防止 XXE
+    _ITERPARSE_OPTIONS = {'resolve_entities': False, 'no_network': True}
+except ImportError:
+    import xml.etree.ElementTree as ET
+    # 标准库解析器不会加载外部实体
+    _ITERPARSE_OPTIONS = {}
 # 加载环境变量（最优先）
 load_dotenv()
 
@@ -75,7 +87,7 @@ def setup_logging():
     file_handler.setFormatter(log_format)
     root_logger.addHandler(file_handler)
     
-    logging.info(f"日志级别设置为: {LOG_LEVEL} ({DEFAULT_LOG_LEVEL})")
+    logging.info("日志级别设置为: %s (%s)", LOG_LEVEL, DEFAULT_LOG_LEVEL)
     
     # Flask/Werkzeug 日志配置 - 禁用 werkzeug 的日志输出
     werkzeug_logger = logging.getLogger('werkzeug')
@@ -95,47 +107,104 @@ from qingstor_api.client import QingStorClient
 
 app = Flask(__name__)
 
-# 显示代理配置（启用检测）
-proxy_manager = ProxyManager(check_availability=True)
-if proxy_manager.is_proxy_enabled():
-    app.logger.info(f"代理已启用: {proxy_manager.proxy_url}")
-elif proxy_manager.proxy_url and not proxy_manager.available:
-    app.logger.warning(f"代理不可用: {proxy_manager.proxy_url}，将使用非代理模式")
-else:
-    app.logger.info("未配置代理")
 
-# 初始化组件
-wx_crypt = WXBizMsgCrypt(
-    os.getenv('TOKEN'),
-    os.getenv('ENCODING_AES_KEY'),
-    os.getenv('CORP_ID')
-)
+# 组件工厂（进程内单例，重复调用复用同一实例，避免重复的网络探测和初始化）
+@functools.lru_cache(maxsize=1)
+def get_proxy_manager() -> ProxyManager:
+    """获取代理管理器（未配置 PROXY_URL 时不会做可用性探测）"""
+    return ProxyManager(check_availability=True)
 
-wx_api = WeChatAPI(
-    corp_id=os.getenv('CORP_ID'),
-    agent_id=os.getenv('AGENT_ID'),
-    secret=os.getenv('SECRET')
-)
 
-github_api = GitHubAPI(
-    token=os.getenv('GITHUB_TOKEN'),
-    repo=os.getenv('GITHUB_REPO'),
-    branch=os.getenv('GITHUB_BRANCH', 'main'),
-    proxy_manager_ref=proxy_manager
-)
+@functools.lru_cache(maxsize=1)
+def get_wx_crypt() -> WXBizMsgCrypt:
+    """获取企业微信消息加解密实例（AES 密钥只解码一次，不要在请求内重复创建）"""
+    return WXBizMsgCrypt(
+        os.getenv('TOKEN'),
+        os.getenv('ENCODING_AES_KEY'),
+        os.getenv('CORP_ID')
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def get_wx_api() -> WeChatAPI:
+    """获取企业微信 API 客户端"""
+    return WeChatAPI(
+        corp_id=os.getenv('CORP_ID'),
+        agent_id=os.getenv('AGENT_ID'),
+        secret=os.getenv('SECRET'),
+        session=get_proxy_manager().session
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def get_github_api() -> GitHubAPI:
+    """获取 GitHub API 客户端"""
+    return GitHubAPI(
+        token=os.getenv('GITHUB_TOKEN'),
+        repo=os.getenv('GITHUB_REPO'),
+        branch=os.getenv('GITHUB_BRANCH', 'main'),
+        proxy_manager_ref=get_proxy_manager()
+    )
+
 
-# 初始化青云对象存储客户端（可选）
-qingstor_client = None
-if os.getenv('QINGSTOR_ACCESS_KEY_ID'):
-    qingstor_client = QingStorClient(
+@functools.lru_cache(maxsize=1)
+def get_qingstor_client():
+    """获取青云对象存储客户端（可选，未配置时返回 None）"""
+    if not os.getenv('QINGSTOR_ACCESS_KEY_ID'):
+        return None
+    return QingStorClient(
         access_key_id=os.getenv('QINGSTOR_ACCESS_KEY_ID'),
         secret_access_key=os.getenv('QINGSTOR_SECRET_ACCESS_KEY'),
         zone=os.getenv('QINGSTOR_ZONE', 'pek3a'),
         bucket=os.getenv('QINGSTOR_BUCKET'),  # None 时会从环境变量读取或使用默认值
-        proxy_manager_ref=proxy_manager
+        proxy_manager_ref=get_proxy_manager()
     )
 
+
+# 显示代理配置（可用性检测在后台进行，结果由 ProxyManager 输出日志）
+if get_proxy_manager().proxy_url:
+    app.logger.info("代理已配置: %s，正在后台检测可用性", get_proxy_manager().proxy_url)
+else:
+    app.logger.info("未配置代理")
+
+# 启动时初始化组件（配置错误尽早暴露），之后统一通过工厂函数获取同一实例
+get_wx_crypt()
+get_wx_api()
+get_github_api()
+# 青云对象存储客户端（可选）
+get_qingstor_client()
+
 task_lock = TaskLock()
+TASK_LOCK_TIMEOUT = 15  # 等待其他任务写入 images.txt 的最长秒数
+
+# 目标镜像仓库配置（启动后不会变化，模块加载时读取一次）
+DOCKER_NAMESPACE = os.getenv('DOCKER_NAMESPACE', 'namespace')
+DOCKER_REGISTRY = os.getenv('DOCKER_REGISTRY', 'registry.cn-hangzhou.aliyuncs.com')
+PORT = int(os.getenv('PORT', 3000))
+
+# 后台任务线程池（限制并发数，避免重试风暴时无限创建线程）
+_handler_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv('HANDLER_WORKERS', '8')),
+    thread_name_prefix='handler'
+)
+_monitor_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv('MONITOR_WORKERS', '4')),
+    thread_name_prefix='monitor'
+)
+
+# 后台任务停止信号：线程池的工作线程不是守护线程，解释器退出前会等待它们结束，
+# 因此进程退出时需要通知监控循环提前返回
+_stop_event = threading.Event()
+
+
+def shutdown_background_tasks():
+    """停止后台任务（通知监控循环退出，并取消线程池中排队的任务）"""
+    _stop_event.set()
+    _handler_pool.shutdown(cancel_futures=True)
+    _monitor_pool.shutdown(cancel_futures=True)
+
+# 预编译正则（webhook 热路径上每次请求都会用到）
+_PLATFORM_RE = re.compile(r'--platform=\S+')
 
 
 def parse_image_list(content: str) -> list:
@@ -149,21 +218,19 @@ def parse_image_list(content: str) -> list:
         镜像名称列表
     """
     images = []
-    
-    # 按换行分割
-    lines = content.split('\n')
-    
-    for line in lines:
-        line = line.strip()
-        if not line or line.startswith('#'):
+
+    # 按换行分割（splitlines 同时处理 \r\n）
+    for raw in content.splitlines():
+        line = raw.strip()
+        if not line or line[0] == '#':
             continue
-        
-        # 处理逗号分隔的多个镜像
-        for item in line.split(','):
-            item = item.strip()
-            if item:
-                images.append(item)
-    
+
+        # 处理逗号分隔的多个镜像（无逗号时直接追加，省去中间列表）
+        if ',' in line:
+            images.extend(filter(None, (item.strip() for item in line.split(','))))
+        else:
+            images.append(line)
+
     return images
 
 
@@ -178,8 +245,7 @@ def format_image_name(image: str) -> str:
         格式化后的镜像名称
     """
     # 移除平台架构参数（如 --platform=linux/amd64）
-    image = re.sub(r'--platform=\S+', '', image).strip()
-    return image
+    return _PLATFORM_RE.sub('', image).strip()
 
 
 def send_response(user_id: str, content: str):
@@ -191,35 +257,45 @@ def send_response(user_id: str, content: str):
         content: 消息内容
     """
     try:
-        app.logger.info(f"发送消息给用户 - 用户: {user_id}, 内容长度: {len(content)} 字符")
-        app.logger.info(f"消息内容: {content}")
-        wx_api.send_text_message(user_id, content)
-        app.logger.info(f"消息发送成功 - 用户: {user_id}")
+        app.logger.info("发送消息给用户 - 用户: %s, 内容长度: %d 字符", user_id, len(content))
+        app.logger.info("消息内容: %s", content)
+        get_wx_api().send_text_message(user_id, content)
+        app.logger.info("消息发送成功 - 用户: %s", user_id)
     except Exception as e:
-        app.logger.error(f"发送消息失败 - 用户: {user_id}, 错误: {str(e)}")
+        app.logger.error("发送消息失败 - 用户: %s, 错误: %s", user_id, e)
 
 
-def monitor_workflow_status(user_id: str, images: list, timeout: int = 600):
+def monitor_workflow_status(user_id: str, images: list, trigger: dict, timeout: int = 600):
     """
     监控 GitHub Actions 工作流状态
     
+    只跟踪本次提交触发的 run（按 head_sha 匹配），其他用户同时发起的同步不会被误报。
+    
     Args:
         user_id: 用户 ID
         images: 镜像列表
+        trigger: 触发信息（GitHubAPI.append_images 的返回值，包含 head_sha 与 after_run_id）
         timeout: 超时时间（秒）
     """
+    head_sha = trigger['head_sha']
+    after_run_id = trigger['after_run_id']
+    
     def check_status():
         start_time = time.time()
         workflow_url = ""
         last_status = None
+        delay = 2
         
         while time.time() - start_time < timeout:
-            # 等待一段时间再检查
-            time.sleep(30)
+            # 指数退避等待（2s, 4s, 8s, 16s, 30s...），尽快发现短任务完成；进程退出时立即结束
+            if _stop_event.wait(delay):
+                return
+            delay = min(delay * 2, 30)
             
             try:
-                run_info = github_api.get_latest_workflow_run()
+                run_info = get_github_api().get_latest_workflow_run(head_sha, after_run_id)
                 
+                # 本次提交的 run 可能尚未创建
                 if not run_info:
                     continue
                 
@@ -231,7 +307,7 @@ def monitor_workflow_status(user_id: str, images: list, timeout: int = 600):
                 # 如果状态发生变化，记录日志
                 if status != last_status:
                     last_status = status
-                    app.logger.info(f"Workflow 状态: {status}, 结论: {conclusion}")
+                    app.logger.info("Workflow 状态: %s, 结论: %s", status, conclusion)
                 
                 # 检查是否完成
                 if status == 'completed':
@@ -256,7 +332,7 @@ def monitor_workflow_status(user_id: str, images: list, timeout: int = 600):
                         break
             
             except Exception as e:
-                app.logger.error(f"检查 workflow 状态失败: {str(e)}")
+                app.logger.error("检查 workflow 状态失败: %s", e)
         
         # 超时提示
         if time.time() - start_time >= timeout:
@@ -267,15 +343,30 @@ def monitor_workflow_status(user_id: str, images: list, timeout: int = 600):
             )
             send_response(user_id, timeout_msg)
     
-    # 启动后台线程监控
-    thread = threading.Thread(target=check_status, daemon=True)
-    thread.start()
+    # 提交到监控线程池后台执行
+    _monitor_pool.submit(check_status)
 
 
 # 用于去重的字典：记录正在处理的请求（用户ID+内容 -> 时间戳）
-_processing_requests = {}
-_processing_lock = threading.Lock()
+# 按 key 的哈希分片，每个分片独立加锁，避免并发重试时所有请求争用同一把锁
 REQUEST_DEDUP_INTERVAL = 5  # 5秒内相同请求只处理一次
+_DEDUP_SHARDS = 16  # 分片数（必须是 2 的幂）
+_DEDUP_MAX_SIZE = 10000 // _DEDUP_SHARDS  # 每个分片最多保留的记录数
+# 分片使用 OrderedDict 按插入时间排序，队首总是最旧的记录
+_processing_shards = [(threading.Lock(), OrderedDict()) for _ in range(_DEDUP_SHARDS)]
+
+
+def _get_dedup_shard(request_key: str):
+    """
+    获取请求 key 所在的去重分片
+
+    Args:
+        request_key: 请求 key（用户ID+内容）
+
+    Returns:
+        (分片锁, 分片字典)
+    """
+    return _processing_shards[hash(request_key) & (_DEDUP_SHARDS - 1)]
 
 
 def is_url(content: str) -> bool:
@@ -287,13 +378,71 @@ def is_url(content: str) -> bool:
     - 不包含换行符（单行URL）
     
     Args:
-        content: 消息内容
+        content: 消息内容（调用方需已去除首尾空白）
         
     Returns:
         是否是 URL
     """
-    url_pattern = r'^https?://[^\s]+$'
-    return bool(re.match(url_pattern, content.strip()))
+    # 用字符串方法代替正则：只需判断协议前缀且不含空白字符
+    return (content.startswith('http://') or content.startswith('https://')) and not any(c.isspace() for c in content)
+
+
+class WXCryptError(Exception):
+    """企业微信回调消息验签或解密失败"""
+    
+    def __init__(self, ret: int):
+        super().__init__(f"解密失败，错误码: {ret}")
+        self.ret = ret
+
+
+# 回调消息中需要的字段
+_WECHAT_FIELDS = frozenset(('MsgType', 'FromUserName', 'Content'))
+
+
+def extract_wechat_fields(xml_content) -> dict:
+    """
+    单次遍历解密后的消息 XML，提取所需字段
+
+    找齐所有字段后立即停止解析，避免构建完整的树再逐个 find
+
+    Args:
+        xml_content: 解密后的消息 XML（str 或 bytes）
+
+    Returns:
+        字段名 -> 文本内容（缺失的字段不在字典中）
+    """
+    # lxml 的 iterparse 只接受字节流，统一转换为 bytes
+    if isinstance(xml_content, str):
+        xml_content = xml_content.encode('utf-8')
+    source = io.BytesIO(xml_content)
+
+    fields = {}
+    for _, element in ET.iterparse(source, events=('end',), **_ITERPARSE_OPTIONS):
+        if element.tag in _WECHAT_FIELDS:
+            fields[element.tag] = element.text
+            element.clear()
+            if len(fields) == len(_WECHAT_FIELDS):
+                break
+    return fields
+
+
+# 用户锁：用户 ID -> 锁
+_user_locks = {}
+_user_locks_guard = threading.Lock()
+
+
+def _get_user_lock(user_id: str) -> threading.Lock:
+    """
+    获取用户对应的锁（不存在时创建）
+    
+    Args:
+        user_id: 用户 ID
+        
+    Returns:
+        用户锁
+    """
+    with _user_locks_guard:
+        return _user_locks.setdefault(user_id, threading.Lock())
 
 
 def handle_image_sync_async(user_id: str, images: list):
@@ -304,58 +453,64 @@ def handle_image_sync_async(user_id: str, images: list):
         user_id: 用户 ID
         images: 镜像列表
     """
-    # 尝试获取锁（原子操作，避免竞态条件）
-    if not task_lock.acquire():
+    # 尝试获取用户锁（每个用户同一时间只处理一个任务，不同用户互不阻塞）
+    user_lock = _get_user_lock(user_id)
+    if not user_lock.acquire(blocking=False):
         send_response(user_id, "⏳ 已有任务正在处理中，请稍后再试")
         return
     
+    trigger = None
     try:
         # 格式化镜像名称（移除平台参数等）
         source_images = [format_image_name(img) for img in images]
         
         # 发送确认消息
         msg_lines = [f"🔄 正在处理镜像同步请求...\n共 {len(source_images)} 个镜像："]
-        namespace = os.getenv('DOCKER_NAMESPACE', 'namespace')
-        registry = os.getenv('DOCKER_REGISTRY', 'registry.cn-hangzhou.aliyuncs.com')
         
         # 构建工作流需要的格式：<源镜像> to <目标镜像>:<标签>
         workflow_images = []
         
         for i, source_image in enumerate(source_images, 1):
-            # 解析源镜像名
-            if ':' in source_image:
-                img_name, img_tag = source_image.split(':', 1)
-            else:
-                img_name, img_tag = source_image, 'latest'
+            # 解析源镜像名（无标签时默认 latest）
+            img_name, _, img_tag = source_image.partition(':')
+            if not img_tag:
+                img_tag = 'latest'
             
             # 获取镜像路径部分
-            img_path = img_name.split('/')[-1]
-            target_image = f"{registry}/{namespace}/{img_path}:{img_tag}"
+            img_path = img_name.rsplit('/', 1)[-1]
+            target_image = f"{DOCKER_REGISTRY}/{DOCKER_NAMESPACE}/{img_path}:{img_tag}"
             
             # 构建工作流格式：源镜像 to 目标镜像:标签
-            workflow_format = f"{source_image} to {target_image}"
-            workflow_images.append(workflow_format)
-            
+            workflow_images.append(f"{source_image} to {target_image}")
             msg_lines.append(f"{i}. {source_image} → {target_image}")
         
         send_response(user_id, '\n'.join(msg_lines))
         
-        # 更新 GitHub（先清空再写入，只同步本次镜像）
-        success = github_api.append_images(workflow_images)
+        # 更新 GitHub（整体替换 images.txt，只同步本次镜像）
+        # 任务锁只保护对 images.txt 的写入，避免多个任务同时提交
+        # 写入很快完成，锁被占用时短暂等待而不是直接拒绝
+        if not task_lock.acquire(timeout=TASK_LOCK_TIMEOUT):
+            send_response(user_id, "⏳ 已有任务正在更新 GitHub，请稍后再试")
+            return
+        try:
+            trigger = get_github_api().append_images(workflow_images)
+        finally:
+            task_lock.release()
         
-        if success:
-            # 启动后台监控任务（会发送最终的成功/失败消息）
-            # 传入源镜像列表用于显示
-            monitor_workflow_status(user_id, source_images)
-        else:
+        if not trigger:
             send_response(user_id, "❌ 更新 GitHub 失败")
         
     except Exception as e:
-        app.logger.error(f"处理镜像同步失败: {str(e)}")
+        app.logger.error("处理镜像同步失败: %s", e)
         send_response(user_id, f"❌ 处理失败: {str(e)}")
     finally:
-        # 释放锁
-        task_lock.release()
+        # 释放用户锁
+        user_lock.release()
+    
+    if trigger:
+        # 锁已全部释放后再启动后台监控任务（会发送最终的成功/失败消息）
+        # 传入源镜像列表用于显示，传入触发信息用于匹配本次的 run
+        monitor_workflow_status(user_id, source_images, trigger)
 
 
 def handle_url_upload_async(user_id: str, url: str):
@@ -366,6 +521,7 @@ def handle_url_upload_async(user_id: str, url: str):
         user_id: 用户 ID
         url: 文件 URL
     """
+    qingstor_client = get_qingstor_client()
     if qingstor_client is None:
         send_response(
             user_id,
@@ -401,7 +557,7 @@ def handle_url_upload_async(user_id: str, url: str):
             )
             
     except Exception as e:
-        app.logger.error(f"上传文件失败: {str(e)}")
+        app.logger.error("上传文件失败: %s", e)
         send_response(user_id, f"❌ 处理失败: {str(e)}")
 
 
@@ -416,9 +572,10 @@ def wechat_callback():
     """企业微信回调接口"""
     # 记录请求信息
     app.logger.info("=" * 60)
-    app.logger.info(f"收到企业微信回调请求: {request.method}")
-    app.logger.info(f"请求路径: {request.path}")
-    app.logger.debug(f"请求参数: {dict(request.args)}")
+    app.logger.info("收到企业微信回调请求: %s", request.method)
+    app.logger.info("请求路径: %s", request.path)
+    if app.logger.isEnabledFor(logging.DEBUG):
+        app.logger.debug("请求参数: %s", dict(request.args))
     
     if request.method == 'GET':
         # 回调验证
@@ -427,21 +584,26 @@ def wechat_callback():
         nonce = request.args.get('nonce')
         echostr = request.args.get('echostr')
         
-        app.logger.debug(f"URL验证请求 - 签名: {msg_signature[:20] if msg_signature else 'None'}..., 时间戳: {timestamp}, 随机数: {nonce}, EchoStr: {echostr[:50] if echostr else 'None'}...")
+        if app.logger.isEnabledFor(logging.DEBUG):
+            app.logger.debug(
+                "URL验证请求 - 签名: %s..., 时间戳: %s, 随机数: %s, EchoStr: %s...",
+                msg_signature[:20] if msg_signature else 'None', timestamp, nonce,
+                echostr[:50] if echostr else 'None'
+            )
         
         if not all([msg_signature, timestamp, nonce, echostr]):
             app.logger.warning("URL验证失败: 缺少必要参数")
             return '缺少参数', 400
         
         try:
-            ret, result = wx_crypt.VerifyURL(msg_signature, timestamp, nonce, echostr)
+            ret, result = get_wx_crypt().VerifyURL(msg_signature, timestamp, nonce, echostr)
             if ret != 0:
-                app.logger.error(f"URL验证失败，错误码: {ret}")
+                app.logger.error("URL验证失败，错误码: %s", ret)
                 return '验证失败', 400
             app.logger.info("URL验证成功")
             return result, 200
         except Exception as e:
-            app.logger.error(f"URL验证异常: {str(e)}")
+            app.logger.error("URL验证异常: %s", e)
             return '验证失败', 400
     
     else:
@@ -450,14 +612,18 @@ def wechat_callback():
         timestamp = request.args.get('timestamp')
         nonce = request.args.get('nonce')
         
-        # 记录请求体（加密内容）
-        try:
-            post_data = request.get_data(as_text=True)
-            app.logger.debug(f"消息请求 - 签名: {msg_signature[:20] if msg_signature else 'None'}..., 时间戳: {timestamp}, 随机数: {nonce}")
-            app.logger.debug(f"加密消息体长度: {len(post_data)} 字符")
-            app.logger.debug(f"加密消息体: {post_data[:200]}..." if len(post_data) > 200 else f"加密消息体: {post_data}")
-        except Exception as e:
-            app.logger.warning(f"读取请求体失败: {str(e)}")
+        # 读取请求体（只读取一次，后续解密复用）
+        raw_data = request.get_data()
+        
+        # 记录请求体（加密内容），仅在 DEBUG 级别时才做解码和格式化
+        if app.logger.isEnabledFor(logging.DEBUG):
+            debug_text = raw_data.decode('utf-8', errors='replace')
+            app.logger.debug("消息请求 - 签名: %s..., 时间戳: %s, 随机数: %s", msg_signature[:20] if msg_signature else 'None', timestamp, nonce)
+            app.logger.debug("加密消息体长度: %d 字符", len(debug_text))
+            if len(debug_text) > 200:
+                app.logger.debug("加密消息体: %s...", debug_text[:200])
+            else:
+                app.logger.debug("加密消息体: %s", debug_text)
         
         if not all([msg_signature, timestamp, nonce]):
             app.logger.warning("消息接收失败: 缺少必要参数")
@@ -465,8 +631,8 @@ def wechat_callback():
         
         try:
             # 解密消息
-            post_data = request.get_data().decode('utf-8')
-            ret, xml_content = wx_crypt.DecryptMsg(
+            post_data = raw_data.decode('utf-8')
+            ret, xml_content = get_wx_crypt().DecryptMsg(
                 post_data,
                 msg_signature,
                 timestamp,
@@ -474,61 +640,59 @@ def wechat_callback():
             )
             
             if ret != 0:
-                app.logger.error(f"消息解密失败，错误码: {ret}")
-                raise Exception(f"解密失败，错误码: {ret}")
+                raise WXCryptError(ret)
             
             app.logger.debug("消息解密成功")
-            app.logger.debug(f"解密后的消息内容: {xml_content}")
+            app.logger.debug("解密后的消息内容: %s", xml_content)
             
             # 解析解密后的消息
-            tree = ET.fromstring(xml_content)
-            msg_type = tree.find('MsgType').text
+            fields = extract_wechat_fields(xml_content)
+            msg_type = fields.get('MsgType')
             
-            app.logger.debug(f"消息类型: {msg_type}")
+            app.logger.debug("消息类型: %s", msg_type)
             
             # 只处理文本消息
             if msg_type != 'text':
-                app.logger.info(f"跳过非文本消息: {msg_type}")
+                app.logger.info("跳过非文本消息: %s", msg_type)
                 return 'success', 200
             
-            user_id = tree.find('FromUserName').text
-            content_node = tree.find('Content')
-            content = content_node.text if content_node is not None else ''
+            user_id = fields.get('FromUserName')
+            content = fields.get('Content') or ''
             content = content.strip()
             
-            app.logger.info(f"收到用户消息 - 用户: {user_id}, 内容: {content}")
+            app.logger.info("收到用户消息 - 用户: %s, 内容: %s", user_id, content)
             
             # 去重检查：避免短时间内重复处理相同请求
             current_time = time.time()
             request_key = f"{user_id}:{content}"
             
-            with _processing_lock:
-                if request_key in _processing_requests:
-                    last_time = _processing_requests[request_key]
+            shard_lock, processing_requests = _get_dedup_shard(request_key)
+            with shard_lock:
+                if request_key in processing_requests:
+                    last_time = processing_requests[request_key]
                     if current_time - last_time < REQUEST_DEDUP_INTERVAL:
-                        app.logger.info(f"跳过重复请求: {content} (上次处理时间: {current_time - last_time:.1f}秒前)")
+                        app.logger.info("跳过重复请求: %s (上次处理时间: %.1f秒前)", content, current_time - last_time)
                         return 'success', 200
                 
-                # 记录处理时间
-                _processing_requests[request_key] = current_time
+                # 记录处理时间（移到队尾，保持按时间排序）
+                processing_requests[request_key] = current_time
+                processing_requests.move_to_end(request_key)
+                
+                # 从队首清理过期的记录，遇到未过期的记录即停止
+                while processing_requests:
+                    oldest_time = next(iter(processing_requests.values()))
+                    if current_time - oldest_time <= REQUEST_DEDUP_INTERVAL:
+                        break
+                    processing_requests.popitem(last=False)
                 
-                # 清理过期的记录（超过去重间隔的记录）
-                expired_keys = [
-                    k for k, t in _processing_requests.items()
-                    if current_time - t > REQUEST_DEDUP_INTERVAL
-                ]
-                for k in expired_keys:
-                    del _processing_requests[k]
+                # 超过容量上限时淘汰最旧的记录
+                while len(processing_requests) > _DEDUP_MAX_SIZE:
+                    processing_requests.popitem(last=False)
             
             # 第一步：检测是否是 URL（优先处理）
             if is_url(content):
                 # 立即返回，在后台异步处理文件上传
-                thread = threading.Thread(
-                    target=handle_url_upload_async,
-                    args=(user_id, content),
-                    daemon=True
-                )
-                thread.start()
+                _handler_pool.submit(handle_url_upload_async, user_id, content)
                 return 'success', 200
             
             # 第二步：尝试解析为 Docker 镜像
@@ -548,22 +712,22 @@ def wechat_callback():
                 return 'success', 200
             
             # 立即返回，在后台异步处理镜像同步
-            thread = threading.Thread(
-                target=handle_image_sync_async,
-                args=(user_id, images),
-                daemon=True
-            )
-            thread.start()
+            _handler_pool.submit(handle_image_sync_async, user_id, images)
             return 'success', 200
             
+        except WXCryptError as e:
+            app.logger.error("消息解密失败，错误码: %s", e.ret)
+            return '解密失败', 400
         except Exception as e:
-            app.logger.error(f"处理消息失败: {str(e)}")
+            app.logger.error("处理消息失败: %s", e)
             return f'处理失败: {str(e)}', 500
 
 
 if __name__ == '__main__':
-    port = int(os.getenv('PORT', 3000))
-    app.run(host='0.0.0.0', port=port, debug=False)
+    try:
+        app.run(host='0.0.0.0', port=PORT, debug=False)
+    finally:
+        shutdown_background_tasks()
 
 
 
@@ -2,45 +2,266 @@
 GitHub API 客户端
 """
 import base64
-from typing import List, Dict, Optional, TYPE_CHECKING
+from typing import List, Dict, Optional, Union, TYPE_CHECKING
 import time
 import os
 import logging
+import threading
 
+import requests
+from urllib3.util.retry import Retry
 # 注意：避免与本地 github_api 包冲突，使用完整的导入
-from github import Github
+from github import Github, RateLimitExceededException
+
+# 优先使用 orjson 解析响应（更快），未安装时回退到标准库
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 logger = logging.getLogger(__name__)
 
+API_BASE_URL = 'https://api.github.com'
+GRAPHQL_URL = f'{API_BASE_URL}/graphql'
+
+# 读取文件内容和分支 HEAD（一次请求）
+_READ_FILE_QUERY = """
+query($owner: String!, $name: String!, $ref: String!, $expression: String!) {
+  repository(owner: $owner, name: $name) {
+    ref(qualifiedName: $ref) { target { oid } }
+    object(expression: $expression) { ... on Blob { text } }
+  }
+}
+"""
+
+# 基于 HEAD 原子提交文件变更
+_COMMIT_MUTATION = """
+mutation($input: CreateCommitOnBranchInput!) {
+  createCommitOnBranch(input: $input) { commit { oid } }
+}
+"""
+
+
+class _RateLimitError(Exception):
+    """GitHub 限额已用尽（自行发起的 HTTP 请求）"""
+    
+    def __init__(self, reset_at: float):
+        super().__init__(f"GitHub API 限额已用尽，重置时间: {reset_at}")
+        self.reset_at = reset_at
+
+
+class _StaleHeadError(Exception):
+    """提交时分支 HEAD 已被其他提交更新（expectedHeadOid 不匹配）"""
+
+
+class _TokenPool:
+    """GitHub Token 池：当前 Token 限额用尽时切换到下一个可用 Token"""
+    
+    def __init__(self, tokens: List[str]):
+        """
+        初始化
+        
+        Args:
+            tokens: Token 列表
+        """
+        if not tokens:
+            raise ValueError("至少需要一个 GitHub Token")
+        self._tokens = list(tokens)
+        self._reset_at = [0.0] * len(self._tokens)  # 限额重置时间（0 表示可用）
+        self._index = 0
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._tokens)
+    
+    @property
+    def current(self) -> str:
+        """当前使用的 Token"""
+        return self._tokens[self._index]
+    
+    def mark_exhausted(self, token: str, reset_at: float) -> Optional[str]:
+        """
+        标记 Token 限额已用尽，并切换到下一个可用 Token
+        
+        Args:
+            token: 用尽限额的 Token
+            reset_at: 限额重置时间（Unix 时间戳）
+            
+        Returns:
+            切换后的 Token，没有可用 Token 时返回 None
+        """
+        with self._lock:
+            index = self._tokens.index(token)
+            self._reset_at[index] = reset_at
+            now = time.time()
+            for offset in range(1, len(self._tokens) + 1):
+                candidate = (index + offset) % len(self._tokens)
+                if self._reset_at[candidate] <= now:
+                    self._index = candidate
+                    return self._tokens[candidate]
+            return None
+
 
 class GitHubAPI:
     """GitHub API 客户端"""
     
-    def __init__(self, token: str, repo: str, branch: str = 'main', proxy_manager_ref=None):
+    def __init__(self, token: Union[str, List[str]], repo: str, branch: str = 'main', proxy_manager_ref=None):
         """
         初始化
         
         Args:
-            token: GitHub Token
+            token: GitHub Token，可传入列表或逗号分隔的多个 Token（限额用尽时自动切换）
             repo: 仓库名称（格式：owner/repo）
             branch: 分支名称
             proxy_manager_ref: 代理管理器引用（ProxyManager 实例）
         """
-        # 配置 GitHub 代理（动态检查，避免循环导入）
-        if proxy_manager_ref and hasattr(proxy_manager_ref, 'is_proxy_enabled') and proxy_manager_ref.is_proxy_enabled():
-            github_base_url = 'https://api.github.com'
-            if proxy_manager_ref.should_use_proxy(github_base_url):
-                proxy_conf = proxy_manager_ref.get_proxy_for_url(github_base_url)
-                # GitHub PyGithub 库通过环境变量设置代理
-                if proxy_conf and 'https' in proxy_conf:
-                    os.environ['HTTPS_PROXY'] = proxy_conf['https']
-                    logger.info(f"🔗 GitHub API 使用代理: {proxy_conf['https']}")
-        
-        self.github = Github(token)
+        # 代理在首次请求时配置（可用性检测在后台进行，初始化时不等待检测结果）
+        self._proxy_manager = proxy_manager_ref
+        self._proxy_ready = False
+        self._proxy_lock = threading.Lock()
+        
+        if isinstance(token, str):
+            tokens = [t.strip() for t in token.split(',') if t.strip()]
+        else:
+            tokens = list(token)
+        self._token_pool = _TokenPool(tokens)
+        
         self.repo_name = repo  # 保存字符串形式的仓库名
-        self.repo = self.github.get_repo(repo)  # Repository 对象
         self.branch = branch
         self.file_path = 'images.txt'
+        
+        # HTTP 会话（GraphQL 及条件请求，复用连接；代理在首次请求时设置到 session.proxies）
+        self._session = requests.Session()
+        self._use_token(self._token_pool.current)
+        
+        # images.txt 读取缓存（配合 ETag 条件请求，未变化时 GitHub 返回 304 且不计入限额）
+        self._file_cache = {'etag': None, 'content': ''}
+    
+    def _use_token(self, token: str):
+        """
+        切换使用的 Token（重建 PyGithub 客户端并更新会话认证头）
+        
+        Args:
+            token: GitHub Token
+        """
+        # 不使用 PyGithub 默认的 GithubRetry：它在限额用尽时会一直休眠到重置时间（最长 1 小时），
+        # 这里只重试服务端错误，限额错误直接抛出 RateLimitExceededException 以便切换 Token
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504])
+        self.github = Github(token, retry=retry)
+        # 延迟加载仓库信息，避免在代理配置完成前发起请求
+        self.repo = self.github.get_repo(self.repo_name, lazy=True)  # Repository 对象（用于 workflow runs 等 REST 接口）
+        self._session.headers['Authorization'] = f'bearer {token}'
+    
+    def _ensure_proxy(self):
+        """
+        首次请求前配置 GitHub 代理（动态检查，避免循环导入）
+        
+        此时后台可用性检测通常已经完成；未完成时等待检测结束（检测请求本身带有超时）。
+        """
+        if self._proxy_ready:
+            return
+        with self._proxy_lock:
+            if self._proxy_ready:
+                return
+            proxy_manager_ref = self._proxy_manager
+            if proxy_manager_ref and hasattr(proxy_manager_ref, 'wait_for_check'):
+                proxy_manager_ref.wait_for_check()
+            if proxy_manager_ref and hasattr(proxy_manager_ref, 'is_proxy_enabled') and proxy_manager_ref.is_proxy_enabled():
+                if proxy_manager_ref.should_use_proxy(API_BASE_URL):
+                    proxy_conf = proxy_manager_ref.get_proxy_for_url(API_BASE_URL)
+                    if proxy_conf and 'https' in proxy_conf:
+                        # 自行发起的请求使用会话代理；PyGithub 库通过环境变量设置代理（每次请求时读取）
+                        self._session.proxies.update(proxy_conf)
+                        os.environ['HTTPS_PROXY'] = proxy_conf['https']
+                        logger.info("🔗 GitHub API 使用代理: %s", proxy_conf['https'])
+            self._proxy_ready = True
+    
+    def _with_token_rotation(self, func):
+        """
+        执行 GitHub 请求，当前 Token 限额用尽时切换 Token 重试
+        
+        Args:
+            func: 发起请求的无参函数
+            
+        Returns:
+            func 的返回值
+        """
+        self._ensure_proxy()
+        for _ in range(len(self._token_pool)):
+            token = self._token_pool.current
+            try:
+                return func()
+            except RateLimitExceededException as e:
+                error = e
+                reset_at = float((e.headers or {}).get('x-ratelimit-reset', 0))
+            except _RateLimitError as e:
+                error = e
+                reset_at = e.reset_at
+            
+            next_token = self._token_pool.mark_exhausted(token, reset_at)
+            if next_token is None:
+                break
+            logger.warning("⚠️  GitHub Token 限额已用尽，切换到下一个 Token")
+            self._use_token(next_token)
+        raise error
+    
+    @staticmethod
+    def _check_response(response: requests.Response):
+        """
+        检查自行发起的 HTTP 请求响应（限额用尽时抛出 _RateLimitError）
+        
+        Args:
+            response: HTTP 响应
+        """
+        if response.status_code in (403, 429) and response.headers.get('X-RateLimit-Remaining') == '0':
+            raise _RateLimitError(float(response.headers.get('X-RateLimit-Reset', 0)))
+        response.raise_for_status()
+    
+    def _graphql(self, query: str, variables: dict) -> dict:
+        """
+        执行 GraphQL 请求
+        
+        Args:
+            query: GraphQL 查询语句
+            variables: 查询变量
+            
+        Returns:
+            响应中的 data 字段
+        """
+        response = self._session.post(
+            GRAPHQL_URL,
+            json={'query': query, 'variables': variables},
+            timeout=30
+        )
+        self._check_response(response)
+        result = json_loads(response.content)
+        if any(error.get('type') == 'RATE_LIMITED' for error in result.get('errors') or []):
+            raise _RateLimitError(float(response.headers.get('X-RateLimit-Reset', 0)))
+        if any(error.get('type') == 'STALE_DATA' or 'Expected branch to point to' in error.get('message', '')
+               for error in result.get('errors') or []):
+            raise _StaleHeadError(f"分支 HEAD 已变化: {result['errors']}")
+        if result.get('errors'):
+            raise Exception(f"GraphQL 请求失败: {result['errors']}")
+        return result['data']
+    
+    def _read_file_with_head(self) -> tuple:
+        """
+        读取 images.txt 内容及分支 HEAD 的 OID
+        
+        Returns:
+            (文件内容，文件不存在时为 None；HEAD OID)
+        """
+        owner, name = self.repo_name.split('/', 1)
+        data = self._with_token_rotation(lambda: self._graphql(_READ_FILE_QUERY, {
+            'owner': owner,
+            'name': name,
+            'ref': f'refs/heads/{self.branch}',
+            'expression': f'{self.branch}:{self.file_path}'
+        }))
+        repository = data['repository']
+        head_oid = repository['ref']['target']['oid']
+        blob = repository['object']
+        return (blob['text'] if blob else None), head_oid
     
     def read_file(self) -> str:
         """
@@ -50,17 +271,35 @@ class GitHubAPI:
             文件内容
         """
         try:
-            file = self.repo.get_contents(self.file_path, ref=self.branch)
-            if file.encoding == 'base64':
-                content = base64.b64decode(file.content).decode('utf-8')
-            else:
-                content = file.decoded_content.decode('utf-8')
+            headers = {'Accept': 'application/vnd.github.raw'}
+            if self._file_cache['etag']:
+                headers['If-None-Match'] = self._file_cache['etag']
+            
+            def fetch_file():
+                response = self._session.get(
+                    f'{API_BASE_URL}/repos/{self.repo_name}/contents/{self.file_path}',
+                    params={'ref': self.branch},
+                    headers=headers,
+                    timeout=30
+                )
+                if response.status_code != 304:
+                    self._check_response(response)
+                return response
+            
+            response = self._with_token_rotation(fetch_file)
+            
+            # 文件未变化，直接返回缓存内容
+            if response.status_code == 304:
+                return self._file_cache['content']
+            
+            content = response.content.decode('utf-8')
+            self._file_cache = {'etag': response.headers.get('ETag'), 'content': content}
             return content
         except Exception as e:
             # 文件不存在，返回空内容
             return ''
     
-    def update_file(self, content: str, message: str = None) -> bool:
+    def update_file(self, content: str, message: str = None) -> Dict[str, any]:
         """
         更新 images.txt 文件
         
@@ -69,79 +308,78 @@ class GitHubAPI:
             message: 提交信息
             
         Returns:
-            是否更新成功
+            触发信息：head_sha 为 workflow 将要运行的提交 OID，
+            after_run_id 表示只有 ID 大于该值的 run 才是本次触发的（0 表示不限制）
         """
         try:
             if message is None:
                 timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
                 message = f"同步镜像 - {timestamp}"
             
-            # 先尝试读取现有文件
-            try:
-                file = self.repo.get_contents(self.file_path, ref=self.branch)
-                file_sha = file.sha
-                file_exists = True
-            except Exception:
-                # 文件不存在
-                file_sha = None
-                file_exists = False
-            
-            if file_exists:
-                # 文件存在，先置空再更新
-                # 第一步：置空文件
-                logger.info(f"清空文件: {self.file_path}")
-                self.repo.update_file(
-                    self.file_path,
-                    "清空镜像列表",
-                    "",
-                    file_sha,
-                    branch=self.branch
-                )
+            contents = base64.b64encode(content.encode('utf-8')).decode('ascii')
+            
+            # 乐观并发：HEAD 被其他提交更新时，重新获取 HEAD 后重试（退避 0.25s、0.5s）
+            max_attempts = 3
+            for attempt in range(max_attempts):
+                # 获取分支 HEAD，作为提交的预期父提交（HEAD 变化时 GitHub 会拒绝提交）
+                current_content, head_oid = self._read_file_with_head()
                 
-                # 第二步：等待文件更新完成（避免并发问题）
-                time.sleep(1)
+                # 内容未变化时提交不会改动 images.txt，也就不会触发 push 事件（常见于同步失败后重发相同镜像），
+                # 改为发送 repository_dispatch 触发 workflow
+                if current_content == content:
+                    logger.info("文件内容未变化，通过 repository_dispatch 触发同步: %s", self.file_path)
+                    # 该提交上可能已有之前的 run（例如失败的那次同步），记录下来以免监控时误匹配
+                    latest_run = self._with_token_rotation(lambda: self._fetch_latest_run(head_oid))
+                    self.trigger_action('dispatch')
+                    return {'head_sha': head_oid, 'after_run_id': latest_run['id'] if latest_run else 0}
                 
-                # 第三步：读取最新的 SHA 并更新内容
-                logger.info(f"更新文件内容: {self.file_path}")
-                updated_file = self.repo.get_contents(self.file_path, ref=self.branch)
-                self.repo.update_file(
-                    self.file_path,
-                    message,
-                    content,
-                    updated_file.sha,
-                    branch=self.branch
-                )
-            else:
-                # 文件不存在，直接创建
-                self.repo.create_file(
-                    self.file_path,
-                    message,
-                    content,
-                    branch=self.branch
-                )
-            
-            return True
+                # 一次提交直接替换文件内容（文件不存在时会创建）
+                logger.info("更新文件内容: %s", self.file_path)
+                try:
+                    data = self._with_token_rotation(lambda: self._graphql(_COMMIT_MUTATION, {
+                        'input': {
+                            'branch': {
+                                'repositoryNameWithOwner': self.repo_name,
+                                'branchName': self.branch
+                            },
+                            'expectedHeadOid': head_oid,
+                            'message': {'headline': message},
+                            'fileChanges': {
+                                'additions': [{
+                                    'path': self.file_path,
+                                    'contents': contents
+                                }]
+                            }
+                        }
+                    }))
+                    # 新提交上不会有之前的 run
+                    return {'head_sha': data['createCommitOnBranch']['commit']['oid'], 'after_run_id': 0}
+                except _StaleHeadError:
+                    if attempt == max_attempts - 1:
+                        raise
+                    logger.warning("⚠️  分支 %s 已被更新，重新获取 HEAD 后重试 (%d/%d)", self.branch, attempt + 1, max_attempts)
+                    time.sleep(0.25 * 2 ** attempt)
             
         except Exception as e:
             raise Exception(f"更新文件失败: {str(e)}")
     
-    def append_images(self, images: List[str]) -> bool:
+    def append_images(self, images: List[str]) -> Dict[str, any]:
         """
-        添加镜像到 images.txt（先清空再写入新内容）
+        添加镜像到 images.txt（用本次镜像替换原有内容）
         
         Args:
             images: 镜像列表
             
         Returns:
-            是否更新成功
+            触发信息（见 update_file）
         """
-        # 去重并排序
-        unique_images = sorted(list(set(images)))
+        # 去重并排序（sorted 直接消费 set，无需中间列表）
+        unique_images = sorted(set(images))
         
         # 生成新内容（只包含本次添加的镜像）
         new_content = '\n'.join(unique_images) + '\n' if unique_images else ''
         
-        # 更新文件（update_file 会先清空再写入）
+        # 更新文件（整体替换文件内容）
         return self.update_file(new_content, f"添加 {len(images)} 个镜像")
     
     def _parse_images(self, content: str) -> List[str]:
@@ -154,27 +392,42 @@ class GitHubAPI:
         Returns:
             镜像列表
         """
-        images = []
-        for line in content.strip().split('\n'):
-            line = line.strip()
-            if line and not line.startswith('#'):
-                images.append(line)
-        return images
+        return [line for line in map(str.strip, content.splitlines()) if line and line[0] != '#']
     
-    def trigger_action(self) -> Dict[str, any]:
+    def trigger_action(self, trigger_via: str = 'dispatch') -> Dict[str, any]:
         """
-        触发 GitHub Actions（通过更新文件）
+        触发 GitHub Actions
+        
+        dispatch 方式发送 repository_dispatch 事件（一次请求，不产生提交），
+        需要 workflow 配置 `on: repository_dispatch: types: [sync-images]`；
+        尚未更新 workflow 的仓库可使用 commit 方式（通过提交 images.txt 触发）。
+        
+        Args:
+            trigger_via: 触发方式（'dispatch' 或 'commit'）
         
         Returns:
             触发结果
         """
-        # 通过更新空行来触发 GitHub Actions
-        current_content = self.read_file()
-        
-        # 添加一个注释行
-        new_content = current_content + '\n# Trigger sync ' + str(time.time())
-        
-        self.update_file(new_content.strip(), '触发同步任务')
+        if trigger_via == 'dispatch':
+            def dispatch():
+                response = self._session.post(
+                    f'{API_BASE_URL}/repos/{self.repo_name}/dispatches',
+                    json={'event_type': 'sync-images', 'client_payload': {'ts': time.time()}},
+                    timeout=30
+                )
+                self._check_response(response)
+            
+            self._with_token_rotation(dispatch)
+        elif trigger_via == 'commit':
+            # 通过更新空行来触发 GitHub Actions
+            current_content = self.read_file()
+            
+            # 添加一个注释行
+            new_content = current_content + '\n# Trigger sync ' + str(time.time())
+            
+            self.update_file(new_content.strip(), '触发同步任务')
+        else:
+            raise ValueError(f"不支持的触发方式: {trigger_via}")
         
         return {
             'success': True,
@@ -182,32 +435,51 @@ class GitHubAPI:
             'timestamp': time.time()
         }
     
-    def get_latest_workflow_run(self) -> Optional[Dict]:
+    def _fetch_latest_run(self, head_sha: Optional[str] = None) -> Optional[Dict]:
+        """
+        获取最新的 workflow run（请求失败时抛出异常）
+        
+        Args:
+            head_sha: 只查询该提交上的 run，None 表示整个仓库
+            
+        Returns:
+            最新的 workflow run 信息，如果没有则返回 None
+        """
+        # self.repo 已经是 Repository 对象，直接使用
+        runs = self.repo.get_workflow_runs(head_sha=head_sha) if head_sha else self.repo.get_workflow_runs()
+        
+        if runs.totalCount > 0:
+            latest_run = runs[0]
+            return {
+                'id': latest_run.id,
+                'head_sha': latest_run.head_sha,
+                'status': latest_run.status,
+                'conclusion': latest_run.conclusion,
+                'html_url': latest_run.html_url,
+                'created_at': latest_run.created_at,
+                'updated_at': latest_run.updated_at
+            }
+        
+        return None
+    
+    def get_latest_workflow_run(self, head_sha: Optional[str] = None, after_run_id: int = 0) -> Optional[Dict]:
         """
         获取最新的 workflow run
         
+        Args:
+            head_sha: 只查询该提交上的 run（update_file 返回的 head_sha），None 表示整个仓库
+            after_run_id: 忽略 ID 不大于该值的 run（同一提交上之前触发的 run）
+        
         Returns:
             最新的 workflow run 信息，如果没有则返回 None
         """
         try:
-            # self.repo 已经是 Repository 对象，直接使用
-            runs = self.repo.get_workflow_runs()
-            
-            if runs.totalCount > 0:
-                latest_run = runs[0]
-                return {
-                    'id': latest_run.id,
-                    'status': latest_run.status,
-                    'conclusion': latest_run.conclusion,
-                    'html_url': latest_run.html_url,
-                    'created_at': latest_run.created_at,
-                    'updated_at': latest_run.updated_at
-                }
-            
-            return None
-            
+            run_info = self._with_token_rotation(lambda: self._fetch_latest_run(head_sha))
+            if run_info and run_info['id'] <= after_run_id:
+                return None
+            return run_info
         except Exception as e:
-            logger.error(f"获取 workflow run 失败: {str(e)}")
+            logger.error("获取 workflow run 失败: %s", e)
             return None
 
 
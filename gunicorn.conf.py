@@ -0,0 +1,28 @@
+"""
+Gunicorn 配置：生产环境运行方式
+
+使用方式：gunicorn -c gunicorn.conf.py app:app
+
+注意：请求去重记录和用户锁保存在进程内存中，因此只启动 1 个 worker 进程，
+通过多线程（gthread）并发处理回调请求。
+"""
+import os
+import sys
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '3000')}"
+workers = 1
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+timeout = 60
+
+
+def worker_exit(server, worker):
+    """worker 进程退出时停止后台任务（监控循环会阻塞重启和 Ctrl-C）"""
+    # app 导入失败时无需清理，也不要在此重新导入
+    app_module = sys.modules.get('app')
+    if app_module is not None:
+        app_module.shutdown_background_tasks()
@@ -3,20 +3,31 @@
 """
 import uuid
 import logging
+import threading
+from email.message import Message
+from email.utils import collapse_rfc2231_value
+from urllib.parse import urlparse, unquote
 logger = logging.getLogger(__name__)
 
 try:
     from qingstor.sdk.service.qingstor import QingStor
     from qingstor.sdk.config import Config
 except ImportError as e:
-    logger.error(f"导入青云 SDK 失败: {e}")
+    logger.error("导入青云 SDK 失败: %s", e)
     raise
 
+# 文件名中需要移除的字符（控制字符、路径分隔符及其他危险字符），用于 str.translate
+_SANITIZE_TABLE = dict.fromkeys([*range(0x20), *map(ord, '<>:"/\\|?*')])
+
 
 class QingStorClient:
     """青云对象存储客户端"""
     
-    def __init__(self, access_key_id: str, secret_access_key: str, zone: str = 'pek3a', bucket: str = None, proxy_manager_ref=None):
+    # 已确认存在的 bucket（所有实例共享，避免每次上传都发送 HEAD 请求）
+    _verified_buckets = set()
+    _verified_buckets_lock = threading.Lock()
+    
+    def __init__(self, access_key_id: str, secret_access_key: str, zone: str = 'pek3a', bucket: str = None, proxy_manager_ref=None, session=None):
         """
         初始化青云对象存储客户端
         
@@ -26,6 +37,7 @@ class QingStorClient:
             zone: 区域，默认 pek3a
             bucket: 存储桶名称，默认从环境变量 QINGSTOR_BUCKET 读取，否则为 'tmp'
             proxy_manager_ref: 代理管理器引用（用于依赖注入）
+            session: 下载使用的 HTTP 会话（requests.Session），默认新建带重试的会话
         """
         import os
         self.config = Config(access_key_id, secret_access_key)
@@ -34,14 +46,53 @@ class QingStorClient:
         # 从参数或环境变量获取 bucket 名称，默认 'tmp'
         self.bucket_name = bucket or os.getenv('QINGSTOR_BUCKET', 'tmp')
         self.proxy_manager = proxy_manager_ref
+        # 只关闭自己创建的会话，外部传入的会话由调用方管理
+        self._owns_session = session is None
+        self._session = session or self._create_session()
+    
+    @staticmethod
+    def _create_session():
+        """
+        创建下载用的 HTTP 会话（连接池复用 + 限流/网关错误自动重试）
+        
+        Returns:
+            requests.Session 实例
+        """
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        
+        retry = Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=[429, 502, 503, 504],
+            respect_retry_after_header=True
+        )
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=retry)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        return session
+    
+    def close(self):
+        """关闭 HTTP 会话，释放连接"""
+        if self._owns_session and self._session is not None:
+            self._session.close()
+            self._session = None
+    
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
     
     def upload_file_from_url(self, url: str, bucket: str = None) -> dict:
         """
         从 URL 下载文件并上传到青云对象存储
         
-        根据文件大小选择策略：
-        - 小文件（< 100MB）：直接内存上传，更快
-        - 大文件（≥ 100MB）：保存到本地，流式上传，节省内存
+        下载内容流式写入临时文件：
+        - 小文件（< 8MB）：保留在内存中
+        - 大文件（≥ 8MB）：自动转存到本地 tmp 目录，节省内存
+        - 超大文件（≥ 100MB 或大小未知）：边下载边分段上传，多个分段并行
         
         Args:
             url: 文件的 HTTPS 链接
@@ -50,20 +101,27 @@ class QingStorClient:
         Returns:
             上传结果，包含文件 URL 和文件名
         """
-        import requests
         import io
+        import requests
+        import shutil
+        import tempfile
         from pathlib import Path
         
         # 确定桶名称
         if bucket is None:
             bucket = self.bucket_name
         
-        # 文件大小阈值：100MB
-        SIZE_THRESHOLD = 100 * 1024 * 1024  # 100MB
+        # 内存缓冲上限：8MB，超过后自动转存到磁盘
+        SPOOL_MAX_SIZE = 8 * 1024 * 1024  # 8MB
+        # 下载拷贝块大小：1MB
+        COPY_CHUNK_SIZE = 1024 * 1024  # 1MB
+        # 分段上传阈值：100MB（大小未知时同样使用分段上传）
+        MULTIPART_THRESHOLD = 100 * 1024 * 1024  # 100MB
+        # 分段大小：16MB
+        MULTIPART_PART_SIZE = 16 * 1024 * 1024  # 16MB
         
-        local_file_path = None
         upload_body = None
-        use_file_storage = False
+        response = None
         
         try:
             # 配置代理（下载外部文件可能使用代理）
@@ -71,34 +129,12 @@ class QingStorClient:
             if self.proxy_manager:
                 proxies = self.proxy_manager.get_proxy_for_url(url)
             
-            # 先发送 HEAD 请求获取文件大小
-            logger.info(f"📥 检测文件信息: {url}")
-            try:
-                head_response = requests.head(url, timeout=10, proxies=proxies, allow_redirects=True)
-                content_length = head_response.headers.get('Content-Length')
-                
-                if content_length:
-                    file_size = int(content_length)
-                    if file_size >= SIZE_THRESHOLD:
-                        use_file_storage = True
-                        logger.info(f"📦 大文件检测（{file_size / 1024 / 1024:.2f}MB），将使用本地存储并流式上传")
-                    else:
-                        logger.info(f"📦 小文件检测（{file_size / 1024 / 1024:.2f}MB），将使用内存直接上传")
-                else:
-                    # 无法获取大小，默认使用本地存储（保守策略）
-                    use_file_storage = True
-                    logger.info("⚠️  无法获取文件大小（无 Content-Length），将使用本地存储并流式上传")
-            except Exception as e:
-                # HEAD 请求失败，使用保守策略
-                use_file_storage = True
-                logger.warning(f"⚠️  文件大小检测失败: {str(e)}，将使用本地存储并流式上传")
-            
             # 下载文件
-            logger.info(f"📥 开始下载文件: {url}")
+            logger.info("📥 开始下载文件: %s", url)
             if proxies:
-                logger.info(f"🔗 通过代理下载文件: {url}")
+                logger.info("🔗 通过代理下载文件: %s", url)
             
-            response = requests.get(url, timeout=30, stream=True, proxies=proxies)
+            response = self._session.get(url, timeout=30, stream=True, proxies=proxies)
             response.raise_for_status()
             
             # 获取文件名
@@ -107,85 +143,59 @@ class QingStorClient:
             # 清理文件名（移除可能的安全风险字符）
             safe_filename = self._sanitize_filename(filename)
             
-            if use_file_storage:
-                # 大文件：保存到本地
-                tmp_dir = Path('tmp')
-                tmp_dir.mkdir(exist_ok=True)
-                local_file_path = tmp_dir / safe_filename
-                
-                logger.info(f"💾 保存文件到本地: {local_file_path}")
-                file_size = 0
-                with open(local_file_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                            file_size += len(chunk)
-                
-                logger.info(f"✅ 文件下载完成 - 大小: {file_size / 1024 / 1024:.2f}MB, 保存路径: {local_file_path}")
-                # 文件对象，用于流式上传
-                upload_body = open(local_file_path, 'rb')
-            else:
-                # 小文件：直接读取到内存
-                logger.info("💾 读取文件到内存")
-                file_content = response.content
-                file_size = len(file_content)
-                logger.info(f"✅ 文件下载完成 - 大小: {file_size / 1024 / 1024:.2f}MB")
-                upload_body = io.BytesIO(file_content)
-            
-            # 使用原始文件名作为 object_key（与本地文件名一致）
+            # 使用原始文件名作为 object_key
             object_key = safe_filename
             
             # 初始化桶
             qingstor_bucket = self.service.Bucket(bucket, self.zone)
             
-            logger.info(f"访问密钥ID: {self.config.access_key_id[:10]}...")
+            logger.info("访问密钥ID: %s...", self.config.access_key_id[:10])
             
-            # 检查 bucket 是否存在，不存在则创建
-            try:
-                head_output = qingstor_bucket.head()
-                logger.info(f"✅ Bucket '{bucket}' 存在")
-            except Exception as head_error:
-                # bucket 不存在，尝试创建
-                error_str = str(head_error)
-                if '404' in error_str or 'Not Found' in error_str or 'not exist' in error_str.lower():
-                    logger.info(f"⚠️  Bucket '{bucket}' 不存在，尝试创建...")
-                    try:
-                        # 创建 bucket
-                        # 青云 SDK 创建 bucket 的方式：调用 put() 方法
-                        logger.debug(f"调用 qingstor_bucket.put() 创建 bucket...")
-                        put_bucket_output = qingstor_bucket.put()
-                        put_status = getattr(put_bucket_output, 'status_code', None) or getattr(put_bucket_output, 'status', None)
-                        
-                        logger.debug(f"Bucket 创建响应: {type(put_bucket_output)}, 状态码: {put_status}")
-                        
-                        if put_status in [200, 201]:
-                            logger.info(f"✅ Bucket '{bucket}' 创建成功")
-                        elif put_status == 409:
-                            logger.info(f"ℹ️  Bucket '{bucket}' 已存在（409 冲突）")
-                        else:
-                            logger.warning(f"⚠️  Bucket 创建返回状态码: {put_status}，继续尝试上传")
-                    except Exception as create_error:
-                        error_msg = str(create_error)
-                        # 409 表示 bucket 已存在，这是正常的
-                        if '409' in error_msg or 'Conflict' in error_msg or 'already exists' in error_msg.lower():
-                            logger.info(f"ℹ️  Bucket '{bucket}' 已存在（创建时返回冲突）")
-                        else:
-                            logger.warning(f"⚠️  Bucket 创建失败: {error_msg}，继续尝试上传（可能已存在）")
-                else:
-                    logger.warning(f"⚠️  Bucket 验证失败: {str(head_error)}，继续尝试上传")
+            # 检查 bucket 是否存在，不存在则创建（同一 bucket 只检查一次）
+            if bucket not in QingStorClient._verified_buckets:
+                with QingStorClient._verified_buckets_lock:
+                    if bucket not in QingStorClient._verified_buckets and self._ensure_bucket(qingstor_bucket, bucket):
+                        QingStorClient._verified_buckets.add(bucket)
             
             # 上传文件到青云（不使用代理）
             # 注意：青云对象存储的上传操作不走代理，确保直连
-            logger.info(f"📤 准备上传到青云对象存储 - 桶: {bucket}, 区域: {self.zone}, 对象: {object_key}, 文件大小: {file_size / 1024 / 1024:.2f}MB")
-            
-            # 使用流式上传（upload_body 可能是文件对象或内存对象）
-            output = qingstor_bucket.put_object(
-                object_key,
-                body=upload_body
-            )
+            logger.info("📤 准备上传到青云对象存储 - 桶: %s, 区域: %s, 对象: %s", bucket, self.zone, object_key)
             
-            # 如果是文件对象，需要关闭
-            if use_file_storage and hasattr(upload_body, 'close'):
+            content_length = response.headers.get('Content-Length')
+            if content_length is None or int(content_length) >= MULTIPART_THRESHOLD:
+                # 超大文件：边下载边分段上传（iter_content 会解码 gzip/deflate 等传输编码）
+                logger.info("📤 使用分段上传 - 分段大小: %.0fMB", MULTIPART_PART_SIZE / 1024 / 1024)
+                parts = self._iter_parts(response.iter_content(chunk_size=COPY_CHUNK_SIZE), MULTIPART_PART_SIZE)
+                output, file_size = self._multipart_upload(qingstor_bucket, object_key, parts)
+                logger.info("✅ 文件下载并上传完成 - 大小: %.2fMB", file_size / 1024 / 1024)
+            else:
+                # 流式写入临时文件（小文件留在内存，大文件自动转存到 tmp 目录，关闭后自动删除）
+                tmp_dir = Path('tmp')
+                tmp_dir.mkdir(exist_ok=True)
+                upload_body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, dir=str(tmp_dir))
+                
+                # 解码 gzip/deflate 等传输编码，保存原始文件内容
+                response.raw.decode_content = True
+                shutil.copyfileobj(response.raw, upload_body, length=COPY_CHUNK_SIZE)
+                file_size = upload_body.tell()
+                upload_body.seek(0)
+                
+                logger.info("✅ 文件下载完成 - 大小: %.2fMB", file_size / 1024 / 1024)
+                
+                # 未超过 SPOOL_MAX_SIZE 时文件仍在内存中，转为 BytesIO 交给 SDK：
+                # requests 计算长度时会调用 fileno()，直接传入会强制转存到磁盘
+                if file_size <= SPOOL_MAX_SIZE:
+                    put_body = io.BytesIO(upload_body.read())
+                else:
+                    put_body = upload_body
+                
+                # 使用流式上传（put_body 为内存缓冲或临时文件对象）
+                output = qingstor_bucket.put_object(
+                    object_key,
+                    body=put_body
+                )
+                
+                # 关闭临时文件（同时删除磁盘上的转存文件）
                 upload_body.close()
             
             # 检查响应（青云 SDK 返回的是一个响应对象）
@@ -197,15 +207,16 @@ class QingStorClient:
                 status_code = output.status
             
             # 打印响应的详细信息用于调试
-            logger.debug(f"上传响应对象类型: {type(output)}")
-            logger.debug(f"上传响应属性: {dir(output)}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("上传响应对象类型: %s", type(output))
+                logger.debug("上传响应属性: %s", dir(output))
             
             if status_code is None:
                 # 如果没有 status_code，可能需要通过其他方式判断
                 logger.warning("⚠️  无法获取响应状态码，假设上传成功")
-                logger.info(f"📤 上传到青云对象存储: {bucket}/{object_key}")
+                logger.info("📤 上传到青云对象存储: %s/%s", bucket, object_key)
             else:
-                logger.info(f"📤 上传到青云对象存储: {bucket}/{object_key}, 响应状态码: {status_code}")
+                logger.info("📤 上传到青云对象存储: %s/%s, 响应状态码: %s", bucket, object_key, status_code)
                 
                 if status_code not in [200, 201]:
                     # 获取详细错误信息
@@ -220,7 +231,7 @@ class QingStorClient:
                         error_details.append(f"响应文本: {output.text}")
                     
                     error_msg = ", ".join(error_details) if error_details else str(output)
-                    logger.error(f"上传失败 - 状态码: {status_code}, 错误详情: {error_msg}")
+                    logger.error("上传失败 - 状态码: %s, 错误详情: %s", status_code, error_msg)
                     
                     # 404 通常表示 bucket 不存在或区域配置错误
                     if status_code == 404:
@@ -239,7 +250,7 @@ class QingStorClient:
             # 青云对象存储的 URL 格式：https://<bucket>.<zone>.qingstor.com/<object_key>
             file_url = f"https://{bucket}.{self.zone}.qingstor.com/{object_key}"
             
-            result = {
+            return {
                 'success': True,
                 'filename': filename,
                 'url': file_url,
@@ -248,17 +259,8 @@ class QingStorClient:
                 'object_key': object_key
             }
             
-            # 只有保存到本地的文件才返回 local_path
-            if use_file_storage and local_file_path:
-                result['local_path'] = str(local_file_path)
-                # 可选：上传成功后删除本地文件（取消注释以启用）
-                # local_file_path.unlink()
-                # logger.info(f"🗑️  已删除本地临时文件: {local_file_path}")
-            
-            return result
-            
         except requests.RequestException as e:
-            logger.error(f"下载文件失败: {url}, 错误: {str(e)}")
+            logger.error("下载文件失败: %s, 错误: %s", url, e)
             # 确保文件对象被关闭
             if upload_body and hasattr(upload_body, 'close'):
                 try:
@@ -270,10 +272,10 @@ class QingStorClient:
                 'error': f"下载文件失败: {str(e)}"
             }
         except Exception as e:
-            logger.error(f"上传文件失败: url={url}, bucket={bucket}, zone={self.zone}, 错误: {str(e)}")
-            logger.error(f"错误详情: {type(e).__name__}: {str(e)}")
+            logger.error("上传文件失败: url=%s, bucket=%s, zone=%s, 错误: %s", url, bucket, self.zone, e)
+            logger.error("错误详情: %s: %s", type(e).__name__, e)
             import traceback
-            logger.error(f"堆栈跟踪: {traceback.format_exc()}")
+            logger.error("堆栈跟踪: %s", traceback.format_exc())
             # 确保文件对象被关闭
             if upload_body and hasattr(upload_body, 'close'):
                 try:
@@ -284,6 +286,170 @@ class QingStorClient:
                 'success': False,
                 'error': f"上传文件失败: {str(e)}"
             }
+        finally:
+            # 关闭流式响应，将连接归还连接池（失败时响应体可能尚未读完）
+            if response is not None:
+                response.close()
+    
+    def _ensure_bucket(self, qingstor_bucket, bucket: str) -> bool:
+        """
+        检查 bucket 是否存在，不存在则创建
+        
+        Args:
+            qingstor_bucket: 青云 Bucket 对象
+            bucket: 存储桶名称
+            
+        Returns:
+            是否确认 bucket 可用（验证失败时返回 False，下次上传重新检查）
+        """
+        try:
+            head_output = qingstor_bucket.head()
+            logger.info("✅ Bucket '%s' 存在", bucket)
+            return True
+        except Exception as head_error:
+            # bucket 不存在，尝试创建
+            error_str = str(head_error)
+            if '404' in error_str or 'Not Found' in error_str or 'not exist' in error_str.lower():
+                logger.info("⚠️  Bucket '%s' 不存在，尝试创建...", bucket)
+                try:
+                    # 创建 bucket
+                    # 青云 SDK 创建 bucket 的方式：调用 put() 方法
+                    logger.debug("调用 qingstor_bucket.put() 创建 bucket...")
+                    put_bucket_output = qingstor_bucket.put()
+                    put_status = getattr(put_bucket_output, 'status_code', None) or getattr(put_bucket_output, 'status', None)
+                    
+                    logger.debug("Bucket 创建响应: %s, 状态码: %s", type(put_bucket_output), put_status)
+                    
+                    if put_status in [200, 201]:
+                        logger.info("✅ Bucket '%s' 创建成功", bucket)
+                        return True
+                    elif put_status == 409:
+                        logger.info("ℹ️  Bucket '%s' 已存在（409 冲突）", bucket)
+                        return True
+                    else:
+                        logger.warning("⚠️  Bucket 创建返回状态码: %s，继续尝试上传", put_status)
+                except Exception as create_error:
+                    error_msg = str(create_error)
+                    # 409 表示 bucket 已存在，这是正常的
+                    if '409' in error_msg or 'Conflict' in error_msg or 'already exists' in error_msg.lower():
+                        logger.info("ℹ️  Bucket '%s' 已存在（创建时返回冲突）", bucket)
+                        return True
+                    else:
+                        logger.warning("⚠️  Bucket 创建失败: %s，继续尝试上传（可能已存在）", error_msg)
+            else:
+                logger.warning("⚠️  Bucket 验证失败: %s，继续尝试上传", head_error)
+        return False
+    
+    @staticmethod
+    def _iter_parts(chunks, part_size: int):
+        """
+        将下载数据块合并为固定大小的分段（最后一段可能较小）
+        
+        Args:
+            chunks: 下载数据块迭代器
+            part_size: 分段大小
+            
+        Returns:
+            分段数据生成器
+        """
+        buffer = bytearray()
+        for chunk in chunks:
+            buffer += chunk
+            while len(buffer) >= part_size:
+                yield bytes(buffer[:part_size])
+                del buffer[:part_size]
+        if buffer:
+            yield bytes(buffer)
+    
+    def _multipart_upload(self, qingstor_bucket, object_key: str, parts, max_workers: int = 6) -> tuple:
+        """
+        分段上传对象（边读取分段边并行上传，失败时中止本次分段上传）
+        
+        Args:
+            qingstor_bucket: 青云 Bucket 对象
+            object_key: 对象名称
+            parts: 分段数据迭代器
+            max_workers: 并行上传的分段数（同时也是内存中缓存的分段上限）
+            
+        Returns:
+            (完成分段上传的响应对象, 文件总大小)
+        """
+        from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+        from itertools import chain
+        
+        # 空文件没有可提交的分段（complete_multipart_upload 不接受空列表），直接上传空对象
+        parts = iter(parts)
+        first_part = next(parts, None)
+        if first_part is None:
+            return qingstor_bucket.put_object(object_key, body=b''), 0
+        parts = chain([first_part], parts)
+        
+        init_output = qingstor_bucket.initiate_multipart_upload(object_key)
+        init_status = getattr(init_output, 'status_code', None)
+        if init_status not in [None, 200, 201]:
+            raise Exception(f"初始化分段上传失败，状态码: {init_status}")
+        upload_id = init_output['upload_id']
+        
+        def upload_part(part_number: int, body: bytes):
+            part_output = qingstor_bucket.upload_multipart(
+                object_key,
+                upload_id=upload_id,
+                part_number=str(part_number),  # SDK 会对查询参数做 URL 编码，只接受字符串
+                body=body
+            )
+            part_status = getattr(part_output, 'status_code', None)
+            if part_status not in [None, 200, 201]:
+                raise Exception(f"分段 {part_number} 上传失败，状态码: {part_status}")
+        
+        file_size = 0
+        part_count = 0
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                pending = set()
+                for part in parts:
+                    # 限制同时在途的分段数，避免下载速度快于上传时占满内存
+                    if len(pending) >= max_workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            future.result()
+                    pending.add(executor.submit(upload_part, part_count, part))
+                    part_count += 1
+                    file_size += len(part)
+                for future in pending:
+                    future.result()
+            
+            output = qingstor_bucket.complete_multipart_upload(
+                object_key,
+                upload_id=upload_id,
+                object_parts=[{'part_number': i} for i in range(part_count)]
+            )
+            return output, file_size
+        except Exception:
+            try:
+                qingstor_bucket.abort_multipart_upload(object_key, upload_id=upload_id)
+            except Exception as abort_error:
+                logger.warning("⚠️  中止分段上传失败: %s", abort_error)
+            raise
+    
+    def upload_urls(self, urls: list, bucket: str = None, max_workers: int = 8) -> list:
+        """
+        并发下载多个 URL 并上传到青云对象存储
+        
+        Args:
+            urls: 文件的 HTTPS 链接列表
+            bucket: 存储桶名称，默认 tmp
+            max_workers: 最大并发数
+            
+        Returns:
+            上传结果列表，顺序与 urls 一致（格式同 upload_file_from_url）
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        
+        if not urls:
+            return []
+        
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as executor:
+            return list(executor.map(lambda url: self.upload_file_from_url(url, bucket), urls))
     
     def _get_filename_from_url(self, url: str, headers: dict) -> str:
         """
@@ -296,15 +462,21 @@ class QingStorClient:
         Returns:
             文件名
         """
-        import re
-        from urllib.parse import urlparse, unquote
-        
-        # 1. 尝试从 Content-Disposition 头获取
+        # 1. 尝试从 Content-Disposition 头获取（支持 RFC 2231/5987 编码的 filename*）
         content_disposition = headers.get('Content-Disposition', '')
         if content_disposition:
-            match = re.search(r'filename[^;=\n]*=(([\'"]).*?\2|[^;\n]*)', content_disposition)
-            if match:
-                filename = match.group(1).strip('\'"')
+            message = Message()
+            message['Content-Disposition'] = content_disposition
+            # 优先使用 filename*：email 解析时会把它合并为元组形式的 filename 参数，
+            # get_filename() 只返回最先出现的那个，同时带有两种参数时可能拿到 ASCII 兜底名
+            params = message.get_params(header='content-disposition') or []
+            encoded = next((value for key, value in params if key == 'filename' and isinstance(value, tuple)), None)
+            if encoded:
+                filename = collapse_rfc2231_value(encoded)
+                if filename:
+                    return filename
+            filename = message.get_filename()
+            if filename:
                 return unquote(filename)
         
         # 2. 从 URL 路径中提取
@@ -328,21 +500,7 @@ class QingStorClient:
         Returns:
             清理后的文件名
         """
-        import re
-        from urllib.parse import unquote
-        
-        # URL 解码
-        filename = unquote(filename)
-        
-        # 移除路径分隔符和危险字符（但保留文件名允许的字符）
+        # URL 解码后移除路径分隔符和危险字符（但保留文件名允许的字符）
         # 保留：字母、数字、点号、连字符、下划线、空格
-        filename = re.sub(r'[<>:"/\\|?*\x00-\x1f]', '', filename)
-        
-        # 移除开头的点和空格（防止隐藏文件或空格问题）
-        filename = filename.lstrip('. ')
-        
-        # 如果清理后为空，使用默认名称
-        if not filename:
-            filename = 'download'
-        
-        return filename
+        # 再移除开头的点和空格（防止隐藏文件或空格问题），清理后为空则使用默认名称
+        return unquote(filename).translate(_SANITIZE_TABLE).lstrip('. ') or 'download'
@@ -0,0 +1,70 @@
+"""
+GitHub API 客户端测试
+"""
+import unittest
+from unittest import mock
+
+from github_api.api import GitHubAPI, _COMMIT_MUTATION, _READ_FILE_QUERY
+
+
+def _read_result(text, oid='abc123'):
+    """构造 _READ_FILE_QUERY 的响应数据"""
+    return {'repository': {'ref': {'target': {'oid': oid}}, 'object': {'text': text} if text is not None else None}}
+
+
+class UpdateFileTest(unittest.TestCase):
+    """update_file 测试"""
+    
+    def setUp(self):
+        self.api = GitHubAPI('token', 'owner/repo')
+    
+    def test_unchanged_content_triggers_dispatch(self):
+        """内容未变化时不提交，改为发送 repository_dispatch，并跳过该提交上已有的 run"""
+        content = 'nginx:latest to registry/ns/nginx:latest\n'
+        with mock.patch.object(self.api, '_graphql', return_value=_read_result(content)) as graphql, \
+                mock.patch.object(self.api, '_fetch_latest_run', return_value={'id': 41}) as fetch_latest_run, \
+                mock.patch.object(self.api, 'trigger_action') as trigger_action:
+            trigger = self.api.update_file(content)
+        
+        self.assertEqual(trigger, {'head_sha': 'abc123', 'after_run_id': 41})
+        fetch_latest_run.assert_called_once_with('abc123')
+        trigger_action.assert_called_once_with('dispatch')
+        queries = [call.args[0] for call in graphql.call_args_list]
+        self.assertEqual(queries, [_READ_FILE_QUERY])
+    
+    def test_changed_content_commits(self):
+        """内容变化时基于 HEAD 提交，不发送 repository_dispatch"""
+        responses = [_read_result('old\n'), {'createCommitOnBranch': {'commit': {'oid': 'def456'}}}]
+        with mock.patch.object(self.api, '_graphql', side_effect=responses) as graphql, \
+                mock.patch.object(self.api, 'trigger_action') as trigger_action:
+            trigger = self.api.update_file('new\n')
+        
+        self.assertEqual(trigger, {'head_sha': 'def456', 'after_run_id': 0})
+        trigger_action.assert_not_called()
+        query, variables = graphql.call_args_list[1].args
+        self.assertEqual(query, _COMMIT_MUTATION)
+        self.assertEqual(variables['input']['expectedHeadOid'], 'abc123')
+
+
+
+class GetLatestWorkflowRunTest(unittest.TestCase):
+    """get_latest_workflow_run 测试"""
+    
+    def setUp(self):
+        self.api = GitHubAPI('token', 'owner/repo')
+    
+    def test_ignores_earlier_run_on_same_commit(self):
+        """同一提交上之前触发的 run 不作为本次结果"""
+        with mock.patch.object(self.api, '_fetch_latest_run', return_value={'id': 41, 'head_sha': 'abc123'}):
+            self.assertIsNone(self.api.get_latest_workflow_run('abc123', after_run_id=41))
+    
+    def test_returns_new_run_on_commit(self):
+        """返回本次触发的 run"""
+        run_info = {'id': 42, 'head_sha': 'abc123'}
+        with mock.patch.object(self.api, '_fetch_latest_run', return_value=run_info) as fetch_latest_run:
+            self.assertEqual(self.api.get_latest_workflow_run('abc123', after_run_id=41), run_info)
+        fetch_latest_run.assert_called_once_with('abc123')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,9 +3,50 @@
 """
 import os
 import time
-import json
 from pathlib import Path
 
+try:
+    import fcntl
+except ImportError:
+    # Windows 没有 fcntl，使用 msvcrt 锁定文件首字节
+    fcntl = None
+    import msvcrt
+
+
+def _try_lock(fd: int) -> bool:
+    """
+    以非阻塞方式对文件加排他锁
+    
+    Args:
+        fd: 文件描述符
+    
+    Returns:
+        是否加锁成功
+    """
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        # BlockingIOError / PermissionError：锁已被持有
+        return False
+
+
+def _unlock(fd: int):
+    """
+    释放文件锁
+    
+    Args:
+        fd: 文件描述符
+    """
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
 
 class TaskLock:
     """任务锁管理"""
@@ -14,49 +55,48 @@ class TaskLock:
         """
         初始化
         
+        使用操作系统的文件锁（flock）实现跨进程互斥，持有锁的进程退出时
+        内核会自动释放锁，无需超时判断。
+        
         Args:
             lock_file: 锁文件路径
         """
         self.lock_file = Path(lock_file)
-        self.lock_timeout = 300  # 5 分钟超时
+        self._fd = None  # 持有锁时的文件描述符
+    
+    def _open(self) -> int:
+        """打开（必要时创建）锁文件"""
+        return os.open(str(self.lock_file), os.O_CREAT | os.O_RDWR, 0o644)
     
-    def acquire(self) -> bool:
+    def acquire(self, timeout: float = 0, interval: float = 0.2) -> bool:
         """
         获取锁
         
+        每次获取都使用新的文件描述符，因此同一进程内的多个线程之间同样互斥。
+        
+        Args:
+            timeout: 锁被占用时最长等待秒数，0 表示不等待
+            interval: 等待期间的重试间隔（秒）
+        
         Returns:
             是否成功获取锁
         """
         try:
-            # 检查是否已有锁
-            if self.lock_file.exists():
-                # 检查锁是否超时
-                try:
-                    lock_data = json.loads(self.lock_file.read_text())
-                    lock_time = lock_data.get('timestamp', 0)
-                    
-                    if time.time() - lock_time < self.lock_timeout:
-                        return False
-                    else:
-                        # 锁已超时，删除
-                        self.lock_file.unlink()
-                except (json.JSONDecodeError, ValueError, OSError):
-                    # 锁文件损坏或读取失败，删除并重新创建
-                    try:
-                        self.lock_file.unlink()
-                    except OSError:
-                        pass
-            
-            # 创建新锁
-            lock_data = {
-                'timestamp': time.time(),
-                'pid': os.getpid()
-            }
-            self.lock_file.write_text(json.dumps(lock_data))
-            return True
-        except Exception:
+            fd = self._open()
+        except OSError:
             # 任何异常都返回 False，表示获取锁失败
             return False
+        
+        deadline = time.monotonic() + timeout
+        while not _try_lock(fd):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                os.close(fd)
+                return False
+            time.sleep(min(interval, remaining))
+        
+        self._fd = fd
+        return True
     
     def release(self) -> bool:
         """
@@ -65,14 +105,18 @@ class TaskLock:
         Returns:
             是否成功释放锁
         """
-        try:
-            if self.lock_file.exists():
-                self.lock_file.unlink()
-                return True
+        fd, self._fd = self._fd, None
+        if fd is None:
             return False
+        
+        try:
+            _unlock(fd)
         except OSError:
-            # 文件删除失败，但锁已失效或不存在，视为成功
-            return True
+            # 解锁失败，关闭文件描述符时锁同样会被释放
+            pass
+        finally:
+            os.close(fd)
+        return True
     
     def is_locked(self) -> bool:
         """
@@ -81,24 +125,15 @@ class TaskLock:
         Returns:
             是否已锁定
         """
-        if not self.lock_file.exists():
+        try:
+            fd = self._open()
+        except OSError:
             return False
         
         try:
-            lock_data = json.loads(self.lock_file.read_text())
-            lock_time = lock_data.get('timestamp', 0)
-            
-            # 检查是否超时
-            if time.time() - lock_time >= self.lock_timeout:
-                self.release()
-                return False
-            
-            return True
-        except (json.JSONDecodeError, ValueError, OSError):
-            # 锁文件损坏，视为未锁定
-            try:
-                self.lock_file.unlink()
-            except OSError:
-                pass
+            if not _try_lock(fd):
+                return True
+            _unlock(fd)
             return False
-
+        finally:
+            os.close(fd)
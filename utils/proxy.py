@@ -3,14 +3,56 @@
 """
 import os
 import logging
+import functools
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import Optional, Dict
 
+# 代理连通性探测地址（返回 204 且无响应体）
+PROXY_CHECK_URL = 'http://www.gstatic.com/generate_204'
+
+
 # 延迟导入日志，避免循环依赖
 def _get_logger():
     return logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=1)
+def _load_proxy_env() -> tuple:
+    """
+    读取并解析代理相关环境变量（只解析一次，所有实例共享）
+    
+    Returns:
+        (代理 URL, 不使用代理的域名元组)
+    """
+    proxy_url = os.getenv('PROXY_URL', '').strip()
+    # 兼容 .example.com 写法，统一去掉开头的点；域名不区分大小写，预先转为小写
+    no_proxy_domains = tuple(d.strip().lstrip('.').lower() for d in os.getenv('NO_PROXY_DOMAINS', '').split(',') if d.strip())
+    return proxy_url, no_proxy_domains
+
+
+@functools.lru_cache(maxsize=256)
+def _is_no_proxy_url(url: str, no_proxy_domains: frozenset, no_proxy_suffixes: tuple) -> bool:
+    """
+    判断 URL 是否在不使用代理的域名列表中（结果缓存，重复的 URL 无需再次解析）
+    
+    Args:
+        url: 目标 URL
+        no_proxy_domains: 不使用代理的域名集合
+        no_proxy_suffixes: 不使用代理的域名后缀（.domain）
+        
+    Returns:
+        是否不使用代理
+    """
+    # 只需要主机名，直接切分字符串，无需 urlparse 构造完整的解析结果
+    netloc = (url.partition('://')[2] or url).split('/', 1)[0].split('?', 1)[0].split('#', 1)[0]
+    domain = netloc.rpartition('@')[2].split(':', 1)[0].lower()  # 移除认证信息和端口
+    
+    return domain in no_proxy_domains or domain.endswith(no_proxy_suffixes)
+
+
 class ProxyManager:
     """代理管理器"""
     
@@ -19,15 +61,59 @@ class ProxyManager:
         初始化代理管理器
         
         Args:
-            check_availability: 是否检查代理可用性
+            check_availability: 是否检查代理可用性（在后台线程中进行，检测完成前视为可用）
         """
-        self.proxy_url = os.getenv('PROXY_URL', '').strip()
-        no_proxy_domains_str = os.getenv('NO_PROXY_DOMAINS', '').strip()
-        self.no_proxy_domains = [d.strip() for d in no_proxy_domains_str.split(',') if d.strip()] if no_proxy_domains_str else []
+        self.proxy_url, no_proxy_domains = _load_proxy_env()
+        # 精确匹配用集合（O(1) 查找），子域名匹配用 .domain 后缀
+        self.no_proxy_domains = frozenset(no_proxy_domains)
+        self._no_proxy_suffixes = tuple('.' + d for d in no_proxy_domains)
         self.available = True  # 默认可用
+        # 共享的 HTTP 会话（复用 keep-alive 连接，避免每次请求重新 TCP+TLS 握手）
+        self.session = self._create_session()
+        
+        # 可用性检测完成事件（无需检测时直接置位）
+        self._checked = threading.Event()
         
         if self.proxy_url and check_availability:
+            threading.Thread(target=self._check_in_background, name='proxy-check', daemon=True).start()
+        else:
+            self._checked.set()
+    
+    def _check_in_background(self):
+        """后台执行代理可用性检测"""
+        try:
             self.check_proxy_availability()
+        finally:
+            self._checked.set()
+    
+    def wait_for_check(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待代理可用性检测完成
+        
+        Args:
+            timeout: 最长等待秒数，None 表示一直等待
+            
+        Returns:
+            检测是否已完成
+        """
+        return self._checked.wait(timeout)
+    
+    @staticmethod
+    def _create_session() -> requests.Session:
+        """
+        创建带连接池的 HTTP 会话（服务端错误自动重试）
+        
+        Returns:
+            requests.Session 实例
+        """
+        # 只对幂等请求（如企业微信获取 token 的 GET）重试，发送消息的 POST 不重试，避免重复发送
+        retry = Retry(total=3, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504],
+                      allowed_methods=Retry.DEFAULT_ALLOWED_METHODS)
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=50, max_retries=retry)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
     
     def should_use_proxy(self, url: str) -> bool:
         """
@@ -42,16 +128,12 @@ class ProxyManager:
         if not self.proxy_url or not self.available:
             return False
         
-        # 检查是否在不使用代理的域名列表中
-        from urllib.parse import urlparse
-        parsed = urlparse(url)
-        domain = parsed.netloc.split(':')[0]  # 移除端口
-        
-        for no_proxy_domain in self.no_proxy_domains:
-            if domain.endswith(no_proxy_domain) or no_proxy_domain.endswith(domain):
-                return False
+        # 未配置不使用代理的域名时无需解析 URL
+        if not self.no_proxy_domains:
+            return True
         
-        return True
+        # 检查是否在不使用代理的域名列表中
+        return not _is_no_proxy_url(url, self.no_proxy_domains, self._no_proxy_suffixes)
     
     def get_proxy_for_url(self, url: str) -> Optional[Dict[str, str]]:
         """
@@ -91,7 +173,7 @@ class ProxyManager:
     
     def check_proxy_availability(self):
         """
-        检查代理是否可用（通过访问 https://www.google.com 测试）
+        检查代理是否可用（通过 HEAD 访问无响应体的 generate_204 探测地址测试）
         """
         if not self.proxy_url:
             self.available = False
@@ -100,26 +182,28 @@ class ProxyManager:
         logger = _get_logger()
         
         try:
-            proxies = self.get_proxy_for_url('https://www.google.com')
+            proxies = self.get_proxy_for_url(PROXY_CHECK_URL)
             if not proxies:
                 # 不需要代理（可能在NO_PROXY列表中）
                 self.available = True
                 return
             
-            response = requests.get(
-                'https://www.google.com',
+            # 探测只发一次，不使用带重试的共享会话（代理不可用时应尽快得出结果）
+            response = requests.head(
+                PROXY_CHECK_URL,
                 proxies=proxies,
-                timeout=10
+                timeout=2,
+                allow_redirects=False
             )
             
-            if response.status_code == 200:
+            if response.status_code == 204:
                 self.available = True
-                logger.info(f"✅ 代理可用: {self.proxy_url}")
+                logger.info("✅ 代理可用: %s", self.proxy_url)
             else:
                 self.available = False
-                logger.warning(f"⚠️ 代理不可用: {self.proxy_url} (状态码: {response.status_code})")
+                logger.warning("⚠️ 代理不可用: %s (状态码: %s)", self.proxy_url, response.status_code)
         except Exception as e:
             self.available = False
-            logger.warning(f"⚠️ 代理不可用: {self.proxy_url}，将使用非代理模式。错误: {str(e)}")
+            logger.warning("⚠️ 代理不可用: %s，将使用非代理模式。错误: %s", self.proxy_url, e)
 
 
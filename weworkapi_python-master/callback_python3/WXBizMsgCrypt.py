@@ -13,11 +13,28 @@ import hashlib
 import time
 import struct
 from Crypto.Cipher import AES
-import xml.etree.cElementTree as ET
 import socket
 
 import ierror
 
+try:
+    # lxml 的 C 解析器更快，未安装时回退到标准库
+    from lxml import etree as ET
+    # 请求体在验签前就会被解析，禁止解析外部实体和访问网络，防止XXE
+    _XML_PARSER = ET.XMLParser(resolve_entities=False, no_network=True)
+except ImportError:
+    import xml.etree.ElementTree as ET
+    # 标准库解析器不会加载外部实体，使用默认解析器
+    _XML_PARSER = None
+
+
+def parse_xml(xmltext):
+    """解析xml字符串
+    @param xmltext: 待解析的xml字节串
+    @return: 根节点
+    """
+    return ET.fromstring(xmltext, _XML_PARSER)
+
 
 """
 关于Crypto.Cipher模块，ImportError: No module named 'Crypto'解决方案
@@ -26,6 +43,10 @@ import ierror
 """
 
 
+# 明文中网络字节序的4字节消息长度
+MSG_LEN_STRUCT = struct.Struct("!I")
+
+
 class FormatException(Exception):
     pass
 
@@ -75,7 +96,10 @@ class XMLParse:
         @return: 提取出的加密消息字符串
         """
         try:
-            xml_tree = ET.fromstring(xmltext)
+            # 统一按字节解析（lxml 不接受带编码声明的 str）
+            if isinstance(xmltext, str):
+                xmltext = xmltext.encode('utf-8')
+            xml_tree = parse_xml(xmltext)
             encrypt = xml_tree.find("Encrypt")
             return ierror.WXBizMsgCrypt_OK, encrypt.text
         except Exception as e:
@@ -138,6 +162,8 @@ class Prpcrypt(object):
 
         # self.key = base64.b64decode(key+"=")
         self.key = key
+        # 初始向量取密钥前16位，只计算一次
+        self.iv = key[:16]
         # 设置加解密模式为AES的CBC模式
         self.mode = AES.MODE_CBC
 
@@ -154,7 +180,7 @@ class Prpcrypt(object):
         pkcs7 = PKCS7Encoder()
         text = pkcs7.encode(text)
         # 加密
-        cryptor = AES.new(self.key, self.mode, self.key[:16])
+        cryptor = AES.new(self.key, self.mode, self.iv)
         try:
             ciphertext = cryptor.encrypt(text)
             # 使用BASE64对加密后的字符串进行编码
@@ -170,7 +196,7 @@ class Prpcrypt(object):
         @return: 删除填充补位后的明文
         """
         try:
-            cryptor = AES.new(self.key, self.mode, self.key[:16])
+            cryptor = AES.new(self.key, self.mode, self.iv)
             # 使用BASE64对密文进行解码，然后AES-CBC解密
             plain_text = cryptor.decrypt(base64.b64decode(text))
         except Exception as e:
@@ -182,11 +208,13 @@ class Prpcrypt(object):
             # 去掉补位字符串
             # pkcs7 = PKCS7Encoder()
             # plain_text = pkcs7.encode(plain_text)
-            # 去除16位随机字符串
-            content = plain_text[16:-pad]
-            xml_len = socket.ntohl(struct.unpack("I", content[: 4])[0])
-            xml_content = content[4: xml_len + 4]
-            from_receiveid = content[xml_len + 4:]
+            # 跳过16位随机字符串，直接在明文上按偏移读取，避免复制中间结果
+            xml_len = MSG_LEN_STRUCT.unpack_from(plain_text, 16)[0]
+            # 长度头超出明文范围说明数据非法，直接返回错误
+            if xml_len + 20 > len(plain_text) - pad:
+                throw_exception("[error]: message length out of range", FormatException)
+            xml_content = plain_text[20: xml_len + 20]
+            from_receiveid = plain_text[xml_len + 20: -pad]
         except Exception as e:
             logger = logging.getLogger()
             logger.error(e)
@@ -214,6 +242,8 @@ class WXBizMsgCrypt(object):
             # return ierror.WXBizMsgCrypt_IllegalAesKey,None
         self.m_sToken = sToken
         self.m_sReceiveId = sReceiveId
+        # 密钥不变，复用同一个加解密对象
+        self.m_pc = Prpcrypt(self.key)
 
         # 验证URL
         # @param sMsgSignature: 签名串，对应URL参数的msg_signature
@@ -230,7 +260,7 @@ class WXBizMsgCrypt(object):
             return ret, None
         if not signature == sMsgSignature:
             return ierror.WXBizMsgCrypt_ValidateSignature_Error, None
-        pc = Prpcrypt(self.key)
+        pc = self.m_pc
         ret, sReplyEchoStr = pc.decrypt(sEchoStr, self.m_sReceiveId)
         return ret, sReplyEchoStr
 
@@ -241,7 +271,7 @@ class WXBizMsgCrypt(object):
         # @param sNonce: 随机串，可以自己生成，也可以用URL参数的nonce
         # sEncryptMsg: 加密后的可以直接回复用户的密文，包括msg_signature, timestamp, nonce, encrypt的xml格式的字符串,
         # return：成功0，sEncryptMsg,失败返回对应的错误码None
-        pc = Prpcrypt(self.key)
+        pc = self.m_pc
         ret, encrypt = pc.encrypt(sReplyMsg, self.m_sReceiveId)
         encrypt = encrypt.decode('utf8')
         if ret != 0:
@@ -275,6 +305,6 @@ class WXBizMsgCrypt(object):
             return ret, None
         if not signature == sMsgSignature:
             return ierror.WXBizMsgCrypt_ValidateSignature_Error, None
-        pc = Prpcrypt(self.key)
+        pc = self.m_pc
         ret, xml_content = pc.decrypt(encrypt, self.m_sReceiveId)
         return ret, xml_content